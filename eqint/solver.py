@@ -1,4 +1,4 @@
-import itertools
+import functools
 import math
 import typing
 from bisect import bisect_right
@@ -10,10 +10,30 @@ from eqint import errors
 Bound = tuple[int | None, int | None]
 Bounds = typing.Sequence[Bound]
 
-# solution table mapping budget to (x, rate) pairs
+# per-allocation lower or upper bounds with infinite sentinels in place of missing bounds
+SentinelBounds = tuple[int | float, ...]
+
+# solution table mapping budget to (x, rate) pairs, stored as parallel tuples of keys, x-values and rates
 SolutionKeys = tuple[int, ...]
-SolutionValues = tuple[tuple[int, int], ...]
-SolutionTable = tuple[SolutionKeys, SolutionValues]
+SolutionValues = tuple[int, ...]
+SolutionTable = tuple[SolutionKeys, SolutionValues, SolutionValues]
+
+# sentinels in place of missing lower / upper bounds (shared objects, such that they can be identified with "is")
+_NEG_INF = -math.inf
+_POS_INF = math.inf
+
+
+class Buffer(typing.Protocol):
+    """Preallocated buffer that allocations can be written to (e.g. list, array.array or NumPy array)."""
+
+    def __len__(self) -> int:
+        ...
+
+    def __setitem__(self, index: int, value: typing.Any, /) -> None:
+        ...
+
+
+Out = typing.TypeVar("Out", bound=Buffer)
 
 
 class EquitableBudgetAllocator:
@@ -26,28 +46,78 @@ class EquitableBudgetAllocator:
         "lower_bound",
         "upper_bound",
         "is_unbounded",
+        "_is_uniform",
+        "_n",
+        "_lower",
+        "_upper",
         "_table",
+        "_hash",
     )
 
     def __init__(self, bounds: Bounds) -> None:
-        # validate constraints
-        if any(b[0] is not None and b[1] is not None and b[0] > b[1] for b in bounds):
-            raise errors.ConstraintError("Invalid constraints")
+        # snapshot bounds, such that later changes to the provided sequence cannot desync the solution table
+        self.bounds = tuple(bounds)
+
+        # accumulate bound statistics in a single pass, validating constraints along the way
+        n_lower_unbounded = n_upper_unbounded = 0
+        lower_sum = upper_sum = 0
+        # per-allocation bounds with infinite sentinels in place of missing bounds
+        lowers: list[int | float] = []
+        uppers: list[int | float] = []
+        for lower, upper in bounds:
+            if lower is None:
+                n_lower_unbounded += 1
+                lowers.append(_NEG_INF)
+            else:
+                lower_sum += lower
+                lowers.append(lower)
+            if upper is None:
+                n_upper_unbounded += 1
+                uppers.append(_POS_INF)
+            else:
+                upper_sum += upper
+                uppers.append(upper)
+                if lower is not None and lower > upper:
+                    raise errors.ConstraintError("Invalid constraints")
 
         # number of allocations without lower / upper bounds
-        self.bounds = bounds
-        self.n_lower_unbounded = sum(b[0] is None for b in self.bounds)
-        self.n_upper_unbounded = sum(b[1] is None for b in self.bounds)
+        self.n_lower_unbounded = n_lower_unbounded
+        self.n_upper_unbounded = n_upper_unbounded
+
+        # number of allocations
+        self._n = len(lowers)
 
         # flag denoting if the problem has no constraints
-        self.is_unbounded = all(b[0] is None and b[1] is None for b in self.bounds)
+        self.is_unbounded = n_lower_unbounded == n_upper_unbounded == self._n
 
         # lower / upper bounds for the budget solution space
-        self.lower_bound = None if self.n_lower_unbounded else sum(b[0] for b in self.bounds)  # type: ignore
-        self.upper_bound = None if self.n_upper_unbounded else sum(b[1] for b in self.bounds)  # type: ignore
+        self.lower_bound = None if n_lower_unbounded else lower_sum
+        self.upper_bound = None if n_upper_unbounded else upper_sum
+
+        # lower / upper bounds of individual allocations
+        self._lower = tuple(lowers)
+        self._upper = tuple(uppers)
+
+        # hash of bounds, computed lazily (and only once) since hashing the bound tuples is linear in their length
+        self._hash: int | None = None
 
-        # construct solution table
-        self._table = self._solve_table()
+        # flag denoting if all allocations share the same bounds (e.g. no constraints), in which case the
+        # solution is just the mean
+        self._is_uniform = not self._n or (
+            self._lower.count(self._lower[0]) == self._upper.count(self._upper[0]) == self._n
+        )
+
+        # construct solution table (unused for uniform bounds)
+        self._table: SolutionTable = (
+            ((), (), ()) if self._is_uniform else _solve_table(self._lower, self._upper, n_lower_unbounded, lower_sum)
+        )
+
+    @classmethod
+    def cached(cls, bounds: Bounds) -> "EquitableBudgetAllocator":
+        """Return an allocator for the bounds, reusing a previously constructed allocator for identical bounds."""
+        # NOTE: the (at most 1024) most recently used allocators are retained for the lifetime of the process
+        # normalize bounds to (hashable) tuples of tuples, e.g. for bounds loaded from JSON
+        return _allocator(cls, tuple(map(tuple, bounds)))  # type: ignore
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(bounds=({self._bounds_repr}))"
@@ -62,143 +132,203 @@ class EquitableBudgetAllocator:
         return f"({', '.join(bound_strs)})"
 
     def __eq__(self, value: object) -> bool:
-        return isinstance(value, self.__class__) and all(
-            b_self == b_val for b_self, b_val in itertools.zip_longest(self.bounds, value.bounds)
-        )
+        return isinstance(value, self.__class__) and self._lower == value._lower and self._upper == value._upper
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash((self._lower, self._upper))
+        return self._hash
+
+    def _solve_region(self, budget: int) -> tuple[int, int, int]:
+        """Return the (x, rate, budget) starting point of the linear region containing the budget."""
+        # handle exterior of solution space
+        if self.lower_bound is not None and budget < self.lower_bound:
+            raise errors.InsufficientBudgetError("Budget outside solution space: cannot satisfy lower bounds.")
+        if self.upper_bound is not None and budget > self.upper_bound:
+            raise errors.ExcessBudgetError("Budget outside solution space: cannot satisfy upper bounds.")
 
-    def _solve_x(self, budget: int) -> tuple[float, int]:
-        """Return the (non-integer) solution to x and the rate (count of non-binding constraints)."""
-        # if there are no constraints on any allocations, the solution is just the mean
-        if self.is_unbounded:
-            return budget / len(self.bounds), len(self.bounds)
+        # if all allocations share the same bounds, the solution is just the mean
+        if self._is_uniform:
+            return 0, self._n, 0
 
         # get ref to solution table
-        keys, values = self._table
+        keys, xs, rates = self._table
 
         # find region with binary search
+        # NOTE: bisect is implemented in C and outperforms a Python-level linear scan even on tables with a
+        # single entry, so there is no separate path for small tables
         budget_key = bisect_right(keys, budget) - 1
 
         # handle exterior of defined solution table
+        # NOTE: budgets below the table are only possible without a lower bound, in which case we can
+        # extrapolate "backwards" from x at the rate of the number of lower-unbounded allocations
         if budget_key < 0:
-            if self.lower_bound is not None:
-                raise errors.InsufficientBudgetError("Budget outside solution space: cannot satisfy lower bounds.")
-            # if no lower bound, we can extrapolate "backwards" from x at the rate of the number of
-            # lower-unbounded allocations
-            x, rate = values[0][0], self.n_lower_unbounded
-            budget_start = keys[0]
-        elif self.upper_bound and budget > self.upper_bound:
-            raise errors.ExcessBudgetError("Budget outside solution space: cannot satisfy upper bounds.")
-            # if not exceeding an upper bound, we can proceed from the upper (defined) boundary of
-            # the solution table and extrapolate forward
-        else:
-            x, rate = values[budget_key]
-            budget_start = keys[budget_key]
+            return xs[0], self.n_lower_unbounded, keys[0]
+        # budgets above the table (within the upper bound) proceed from the upper (defined) boundary of the
+        # solution table and extrapolate forward
+        return xs[budget_key], rates[budget_key], keys[budget_key]
 
+    def _solve_x(self, budget: int) -> tuple[float, int]:
+        """Return the (non-integer) solution to x and the rate (count of non-binding constraints)."""
+        x, rate, budget_start = self._solve_region(budget)
         # budget_start + dx * rate = budget <=> dx = (budget - budget_start) / rate
         return x if not rate else x + (budget - budget_start) / rate, rate
 
+    def _solve_integer_x(self, budget: int) -> tuple[int, int, int]:
+        """Return the floor of the solution to x, the rate and the count of non-binding allocations to ceil."""
+        x, rate, budget_start = self._solve_region(budget)
+        if not rate:
+            return x, rate, 0
+        # rate * x + (budget - budget_start) = rate * floor(x) + remainder, where the remainder is exactly
+        # the number of non-binding allocations that must be ceiled to exhaust the budget
+        floor_x, n_ceiled = divmod(rate * x + budget - budget_start, rate)
+        return floor_x, rate, n_ceiled
+
+    def budget(self, x: float) -> float:
+        """Evaluate the budget allocated for the specified value of x (i.e. the sum of its allocations)."""
+        # if all allocations share the same bounds, they are all x clamped to those bounds
+        if self._is_uniform:
+            return self._n * min(max(x, self._lower[0]), self._upper[0]) if self._n else 0
+
+        # get ref to solution table
+        keys, xs, rates = self._table
+
+        # find region with binary search on values of x (sorted along with the budget keys)
+        x_key = bisect_right(xs, x) - 1
+
+        # below the table the budget changes at the rate of the number of lower-unbounded allocations
+        if x_key < 0:
+            return keys[0] + (x - xs[0]) * self.n_lower_unbounded
+        return keys[x_key] + (x - xs[x_key]) * rates[x_key]
+
     def allocations(self, x: float) -> tuple[float, ...]:
         """Evaluate the constrained allocations for the specified value of x."""
         return tuple(
-            itertools.chain(
-                (
-                    # lower bound if x is above it
-                    float(b[0]) if b[0] is not None and x < b[0]
-                    # upper bound if x is below it
-                    else float(b[1]) if b[1] is not None and x > b[1]
-                    # else value
-                    else x
-                    for b in self.bounds
-                ),
-            )
+            # lower bound if x is above it
+            float(lower) if x < lower
+            # upper bound if x is below it
+            else float(upper) if x > upper
+            # else value
+            else x
+            for lower, upper in zip(self._lower, self._upper)
         )
 
-    def _integer_allocations(self, x: float, n_nonbinding: int) -> tuple[int, ...]:
-        """Evaluate the constrained integer allocations for the specified value of x."""
-        # want to apply n floors and m-n ceils such that the budget remains exhausted, i.e.
-        #   n * floor(x) + (m-n) * ceil(x) = m * x
-        # with m being total non-binding constraints
-        #
-        # if ceil(x) > floor(x):
-        #   n = m * (ceil(x) - x) / (ceil(x) - floor(x))
-        #     = m * (ceil(x) - x)
-        # since ceil(x) - floor(x) = 1
-        #
-        # if ceil(x) == floor(x):
-        #   n in [0,m]
-        # hence can reuse above case
-        floor_x, ceil_x = math.floor(x), math.ceil(x)
-        n_floored = round(n_nonbinding * (ceil_x - x))
-
-        # track the count of floored values
-        counter = itertools.count(0)
+    def _integer_allocations(self, floor_x: int, n_nonbinding: int, n_ceiled: int) -> tuple[int, ...]:
+        """Evaluate the constrained integer allocations for the floored solution x."""
+        # x is in the interval [floor(x), ceil(x)], so an (integer) bound is binding for x exactly when it is
+        # binding for floor(x) (lower bounds) or ceil(x) (upper bounds)
+        ceil_x = floor_x + 1 if n_ceiled else floor_x
+        n_floored = n_nonbinding - n_ceiled
+
+        allocations: list[int] = []
+        for lower, upper in zip(self._lower, self._upper):
+            if floor_x < lower:
+                # lower bound if x is above it
+                allocations.append(lower)  # type: ignore
+            elif ceil_x > upper:
+                # upper bound if x is below it
+                allocations.append(upper)  # type: ignore
+            elif n_floored:
+                # else floor until count has been reached, then ceil
+                allocations.append(floor_x)
+                n_floored -= 1
+            else:
+                allocations.append(ceil_x)
+        return tuple(allocations)
 
-        return tuple(
-            itertools.chain(
-                (
-                    # lower bound if x is above it
-                    b[0] if b[0] is not None and x < b[0]
-                    # upper bound if x is below it
-                    else b[1] if b[1] is not None and x > b[1]
-                    # else floor until count has been reached, then ceil
-                    else floor_x if next(counter) < n_floored else ceil_x
-                    for b in self.bounds
-                ),
-            )
+    @typing.overload
+    def solve(self, budget: int, integer: typing.Literal[True] = ..., *, out: None = ...) -> tuple[int, ...]:
+        ...
+
+    @typing.overload
+    def solve(self, budget: int, integer: typing.Literal[False] = ..., *, out: None = ...) -> tuple[float, ...]:
+        ...
+
+    @typing.overload
+    def solve(self, budget: int, integer: bool = ..., *, out: Out) -> Out:
+        ...
+
+    def solve(self, budget: int, integer: bool = True, *, out: Out | None = None) -> typing.Any:
+        """Solve the (integer) allocation problem and return the resulting allocations (written to out if given)."""
+        allocations = (
+            self._integer_allocations(*self._solve_integer_x(budget))
+            if integer
+            else self.allocations(self._solve_x(budget)[0])
         )
+        if out is None:
+            return allocations
+        # validate buffer before writing, such that it is never left partially written
+        if len(out) != self._n:
+            raise ValueError(f"Buffer of length {len(out)} does not match the number of allocations ({self._n})")
+        # write allocations to preallocated buffer
+        for i, allocation in enumerate(allocations):
+            out[i] = allocation
+        return out
 
     @typing.overload
-    def solve(self, budget: int, integer: typing.Literal[True] = ...) -> tuple[int, ...]:
+    def solve_many(
+        self, budgets: typing.Iterable[int], integer: typing.Literal[True] = ...
+    ) -> tuple[tuple[int, ...], ...]:
         ...
 
     @typing.overload
-    def solve(self, budget: int, integer: typing.Literal[False] = ...) -> tuple[float, ...]:
+    def solve_many(
+        self, budgets: typing.Iterable[int], integer: typing.Literal[False] = ...
+    ) -> tuple[tuple[float, ...], ...]:
         ...
 
-    def solve(self, budget: int, integer: bool = True) -> tuple[typing.Any, ...]:
-        """Solve the (integer) allocation problem and return the resulting allocations."""
-        x, rate = self._solve_x(budget)
-        if not integer:
-            return self.allocations(x)
-        return self._integer_allocations(x, rate)
+    def solve_many(self, budgets: typing.Iterable[int], integer: bool = True) -> tuple[tuple[typing.Any, ...], ...]:
+        """Solve the (integer) allocation problem for each of the budgets (a convenience loop over solve)."""
+        return tuple(self.solve(budget, integer) for budget in budgets)  # type: ignore
 
     @property
     def flat_bounds(self) -> list[tuple[int, bool]]:
         """Lower- and upper bounds flattened into sorted tuples of (value, is_upper_bound flag)."""
-        lower_bounds = ((b[0], False) for b in self.bounds if b[0] is not None)
-        upper_bounds = ((b[1], True) for b in self.bounds if b[1] is not None)
-        return sorted(itertools.chain(lower_bounds, upper_bounds), key=itemgetter(0))
-
-    def _solve_table(self) -> SolutionTable:
-        """Compute budget |-> (x, rate) solution table of linear regions for bounds."""
-        # initialize variables
-        budget = 0  # lower bounds are accumulated in loop
-        rate = self.n_lower_unbounded  # initial rate is 1 per non-lower-bounded element
-
-        # construct intermediary table mapping values of x to rates of budget allocation
-        r_table: dict[int, int] = {}
-        for x, is_upper in self.flat_bounds:
-            if is_upper:
-                # if upper bound: rate decreases
-                rate -= 1
-            else:
-                # if lower bound: rate and budget increases
-                rate += 1
-                budget += x
-            r_table[x] = rate
-
-        # construct final table mapping budget to x-value and rates on linear sections
-        prev_x, prev_rate = 0, self.n_lower_unbounded
-        x_table: dict[int, tuple[int, int]] = {}
-
-        # NOTE: since bounds are pre-sorted, insertion order of dicts ensures that keys are sorted
-        for x, rate in r_table.items():
-            # accumulate the mapping from regions of budgets to values of x
-            budget += (x - prev_x) * prev_rate
-            x_table[budget] = (x, rate)
-            prev_x, prev_rate = x, rate
-
-        return tuple(x_table.keys()), tuple(x_table.values())
+        return _flatten_bounds(self._lower, self._upper)
+
+
+def _flatten_bounds(lower: SentinelBounds, upper: SentinelBounds) -> list[tuple[int, bool]]:
+    """Lower- and upper bounds flattened into sorted tuples of (value, is_upper_bound flag)."""
+    flat_bounds = [(b, False) for b in lower if b is not _NEG_INF] + [(b, True) for b in upper if b is not _POS_INF]
+    # NOTE: lower bounds are concatenated first, so the stable sort places them before upper bounds of equal value
+    flat_bounds.sort(key=itemgetter(0))
+    return flat_bounds  # type: ignore
+
+
+@functools.lru_cache(maxsize=1024)
+def _solve_table(lower: SentinelBounds, upper: SentinelBounds, n_lower_unbounded: int, lower_sum: int) -> SolutionTable:
+    """Compute budget |-> (x, rate) solution table of linear regions for bounds."""
+    # initialize variables at x = 0, where the budget is the sum of lower bounds when extrapolating
+    # linearly from the first region (lower-unbounded allocations contribute x = 0)
+    budget = lower_sum
+    prev_x = 0
+    rate = n_lower_unbounded  # initial rate is 1 per non-lower-bounded element
+
+    # construct table mapping budget to x-value and rates on linear sections
+    # NOTE: repeated values of x yield repeated budget keys, in which case bisection picks the last
+    # (i.e. fully updated) rate
+    keys: list[int] = []
+    xs: list[int] = []
+    rates: list[int] = []
+    for x, is_upper in _flatten_bounds(lower, upper):
+        # accumulate the budget at the rate of the previous region
+        budget += (x - prev_x) * rate
+        # if upper bound: rate decreases, if lower bound: rate increases
+        rate += -1 if is_upper else 1
+        keys.append(budget)
+        xs.append(x)
+        rates.append(rate)
+        prev_x = x
+
+    return tuple(keys), tuple(xs), tuple(rates)
+
+
+# NOTE: the cache holds strong references to (at most 1024) allocators along with their solution tables
+# for the lifetime of the process; solutions themselves are not memoized
+@functools.lru_cache(maxsize=1024)
+def _allocator(cls: type[EquitableBudgetAllocator], bounds: tuple[Bound, ...]) -> EquitableBudgetAllocator:
+    """Construct an allocator, reusing previous instances for identical bounds."""
+    return cls(bounds)
 
 
 @typing.overload
@@ -213,4 +343,4 @@ def solve(bounds: Bounds, budget: int, integer: typing.Literal[False] = ...) ->
 
 def solve(bounds: Bounds, budget: int, integer: bool = True) -> tuple[typing.Any, ...]:
     """Solve the (integer) allocation problem and return the resulting allocations."""
-    return EquitableBudgetAllocator(bounds).solve(budget, integer)  # type: ignore
+    return EquitableBudgetAllocator.cached(bounds).solve(budget, integer)  # type: ignore
@@ -55,6 +55,9 @@ def savefig(fig: Figure, fname: typing.Optional[str] = None, *args, **kwargs):
 # typed subplots (flattening dimensions of length 1)
 ShareType = bool | typing.Literal["none", "all", "row", "col"]
 
+# keyword arguments of plt.subplots that apply to the subplot grid (all others are passed on to figure creation)
+_SUBPLOTS_KWARGS = frozenset(("width_ratios", "height_ratios", "subplot_kw", "gridspec_kw"))
+
 
 @typing.overload
 def subplots(
@@ -64,6 +67,7 @@ def subplots(
     *,
     sharex: ShareType = ...,
     sharey: ShareType = ...,
+    fig: Figure | None = ...,
     **kwargs,
 ) -> tuple[Figure, Axes]:
     ...
@@ -77,6 +81,7 @@ def subplots(
     *,
     sharex: ShareType = ...,
     sharey: ShareType = ...,
+    fig: Figure | None = ...,
     **kwargs,
 ) -> tuple[Figure, tuple[Axes, ...]]:
     ...
@@ -90,6 +95,7 @@ def subplots(
     *,
     sharex: ShareType = ...,
     sharey: ShareType = ...,
+    fig: Figure | None = ...,
     **kwargs,
 ) -> tuple[Figure, tuple[Axes, ...]]:
     ...
@@ -103,6 +109,7 @@ def subplots(
     *,
     sharex: ShareType = ...,
     sharey: ShareType = ...,
+    fig: Figure | None = ...,
     **kwargs,
 ) -> tuple[Figure, tuple[tuple[Axes, ...], ...]]:
     ...
@@ -115,9 +122,21 @@ def subplots(
     *,
     sharex: ShareType = True,
     sharey: ShareType = False,
+    fig: Figure | None = None,
     **kwargs,
 ) -> tuple[Figure, typing.Any]:
-    f, axs_ = plt.subplots(nrows, ncols, sharex=sharex, sharey=sharey, squeeze=False, figsize=figsize, **kwargs)
+    if fig is None:
+        f, axs_ = plt.subplots(nrows, ncols, sharex=sharex, sharey=sharey, squeeze=False, figsize=figsize, **kwargs)
+    else:
+        # reuse existing figure (skipping figure / canvas construction)
+        if fig_kwargs := sorted(kwargs.keys() - _SUBPLOTS_KWARGS):
+            raise TypeError(
+                f"Figure keyword arguments cannot be applied to an existing figure: {', '.join(fig_kwargs)}"
+            )
+        f = fig
+        f.clear()
+        f.set_size_inches(figsize if figsize is not None else mpl.rcParams["figure.figsize"])
+        axs_ = f.subplots(nrows, ncols, sharex=sharex, sharey=sharey, squeeze=False, **kwargs)
     # return Figure, Axes if only one subplot
     if axs_.size == 1:
         return f, axs_[0, 0]
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import itertools
 import typing
 from abc import ABC
 
@@ -29,7 +30,7 @@ def draw_rect(ax: Axes, y: int, x: int, height: int, width: int, **kwargs):
 
 class LayoutElement(ABC):
     def __init__(self, bounds: Bounds | None, **kwargs) -> None:
-        self.solver = EquitableBudgetAllocator(bounds if bounds else [(0, None)])
+        self.solver = EquitableBudgetAllocator.cached(bounds if bounds else [(0, None)])
         self.kwargs = {"facecolor": "none", "edgecolor": C[0], **kwargs}
 
     def draw(self, ax: Axes, y: int, x: int, height: int, width: int, **kwargs) -> None:
@@ -70,10 +71,11 @@ class Row(LayoutElement):
 
     def draw(self, ax: Axes, y: int, x: int, height: int, width: int, **kwargs) -> None:
         if self.columns:
-            column_x = x
-            for column, column_width in zip(self.columns, self.solver.solve(width)):
+            column_widths = self.solver.solve(width)
+            for column, column_x, column_width in zip(
+                self.columns, itertools.accumulate(column_widths, initial=x), column_widths
+            ):
                 column.draw(ax, y, column_x, height, column_width, **kwargs)
-                column_x += column_width
         super().draw(ax, y, x, height, width, **kwargs)
 
 
@@ -96,10 +98,9 @@ class Column(LayoutElement):
 
     def draw(self, ax: Axes, y: int, x: int, height: int, width: int, **kwargs):
         if self.rows:
-            row_y = y
-            for row, row_height in zip(self.rows, self.solver.solve(height)):
+            row_heights = self.solver.solve(height)
+            for row, row_y, row_height in zip(self.rows, itertools.accumulate(row_heights, initial=y), row_heights):
                 row.draw(ax, row_y, x, row_height, width, **kwargs)
-                row_y += row_height
         super().draw(ax, y, x, height, width, **kwargs)
 
 
@@ -1,46 +1,39 @@
-import itertools
+import argparse
+import json
 import math
+import multiprocessing
 import typing
+from pathlib import Path
 
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+import numpy as np
 from matplotlib import ticker
+from matplotlib.figure import Figure
 
 from eqint.solver import Bounds, EquitableBudgetAllocator
 from plots import rc_context, savefig, subplots
 
-T = typing.TypeVar("T")
-S = typing.TypeVar("S")
-
 
 def get_domain(bounds: Bounds) -> tuple[int, int]:
     """Get base domain of evaluation (smallest and largest explicit bound values)."""
-    start, end = None, None
-    for b in itertools.chain.from_iterable(bounds):
-        if b is not None:
-            start = b if start is None else min(start, b)
-            end = b if end is None else max(end, b)
-    return typing.cast(int, start), typing.cast(int, end)
+    values = [b for bound in bounds for b in bound if b is not None]
+    return min(values), max(values)
 
 
-def get_segments(xs: typing.Sequence[T], ys: typing.Sequence[S]) -> list[tuple[list[T], list[S]]]:
+def get_segments(
+    xs: typing.Sequence[float], ys: typing.Sequence[float] | np.ndarray
+) -> list[tuple[np.ndarray, np.ndarray]]:
     """Split sequences into continuous segments."""
-    prev_y = None, None
-    segments: list[tuple[list[T], list[S]]] = []
-    segment_x: list[T] = []
-    segment_y: list[S] = []
-    for x, y in zip(xs, ys):
-        if y == prev_y:
-            # skip single-element segments
-            if len(segment_x) > 1:
-                segments.append((segment_x, segment_y))
-            segment_x, segment_y = [], []
-        segment_x.append(x)
-        segment_y.append(y)
-        prev_y = y
-    segments.append((segment_x, segment_y))
-    return segments
-
-
-def plot_h(bounds: Bounds):
+    xs_, ys_ = np.asarray(xs), np.asarray(ys)
+    # split where consecutive values are equal, i.e. at discontinuities of the inverse
+    splits = np.flatnonzero(np.diff(ys_) == 0) + 1
+    segments = list(zip(np.split(xs_, splits), np.split(ys_, splits)))
+    # skip single-element segments (except for the last segment)
+    return [(x, y) for x, y in segments[:-1] if len(x) > 1] + segments[-1:]
+
+
+def plot_h(bounds: Bounds, fig: Figure | None = None):
     """Plot the mapping from x to budgets."""
     # get domain of plot
     start, end = get_domain(bounds)
@@ -48,22 +41,14 @@ def plot_h(bounds: Bounds):
     xs = range(start, end + 1)
 
     # evaluate on domain
-    solver = EquitableBudgetAllocator(bounds)
-    budgets = [sum(solver.allocations(x)) for x in xs]
+    solver = EquitableBudgetAllocator.cached(bounds)
+    budgets = np.fromiter((solver.budget(x) for x in xs), dtype=np.float64, count=len(xs))
 
     # infer rate of change
-    def rates_of_change(xs, budgets):
-        rates = []
-        for i in range(1, len(budgets)):
-            d_budget = budgets[i] - budgets[i - 1]
-            d_x = xs[i] - xs[i - 1]
-            rates.append(d_budget / d_x)
-        return rates
-
-    rates = rates_of_change(xs, budgets)
+    rates = np.diff(budgets) / np.diff(xs)
 
     # show x ticks on all subplots
-    f, axs = subplots(3, sharex=True, figsize=(7, 7))
+    f, axs = subplots(3, sharex=True, figsize=(7, 7), fig=fig)
     axs[0].xaxis.set_minor_locator(ticker.AutoMinorLocator(2))
     for ax in axs:
         ax.xaxis.set_tick_params(labelbottom=True)
@@ -76,37 +61,36 @@ def plot_h(bounds: Bounds):
 
     # plot left extrapolation
     l_xs = [start - padding, start]
-    l_budgets = [sum(solver.allocations(x)) for x in l_xs]
+    l_budgets = np.array([solver.budget(start - padding), budgets[0]])
     axs[0].plot(l_xs, l_budgets, linestyle="--")
     # plot right extrapolation
     r_xs = [end, end + padding]
-    r_budgets = [sum(solver.allocations(x)) for x in r_xs]
+    r_budgets = np.array([budgets[-1], solver.budget(end + padding)])
     axs[0].plot(r_xs, r_budgets, linestyle="--")
 
     # plot bounds
-    for i, b in enumerate(reversed(bounds)):
-        lower = b[0] if b[0] is not None else start - padding
-        upper = b[1] if b[1] is not None else end + padding
-        axs[1].plot([lower, upper], [i, i], linestyle="--" if b[0] is None or b[1] is None else "-")
-        if b[0] is not None:
+    n = len(bounds)
+    for i in range(n):
+        lb, ub = bounds[n - 1 - i]
+        has_lower, has_upper = lb is not None, ub is not None
+        lower = lb if lb is not None else start - padding
+        upper = ub if ub is not None else end + padding
+        axs[1].plot([lower, upper], [i, i], linestyle="-" if has_lower and has_upper else "--")
+        if has_lower:
             axs[1].plot(lower, i, marker="<")
-        if b[1] is not None:
+        if has_upper:
             axs[1].plot(upper, i, marker=">")
-    axs[1].set_yticks(range(len(bounds)), [f"$a_{{{i+1}}}$" for i in reversed(range(len(bounds)))])
+    axs[1].set_yticks(range(n), [f"$a_{{{n - i}}}$" for i in range(n)])
     axs[1].set_title("Bounds")
     axs[1].set_xlabel("$x$")
     axs[1].set_ylabel("Allocation")
 
     # plot left extrapolated rate
-    l_xs = [start - padding, start]
-    l_budgets = [sum(solver.allocations(x)) for x in l_xs]
-    l_rate = rates_of_change(l_xs, l_budgets)
+    l_rate = np.diff(l_budgets) / np.diff(l_xs)
     axs[2].step([*l_xs, xs[0]], [l_rate[0], l_rate[0], rates[0]], where="post", linestyle="--")
 
     # plot right extrapolated rate
-    r_xs = [end, end + padding]
-    r_budgets = [sum(solver.allocations(x)) for x in r_xs]
-    r_rate = rates_of_change(r_xs, r_budgets)
+    r_rate = np.diff(r_budgets) / np.diff(r_xs)
     axs[2].step([xs[-1], *r_xs], [rates[-1], r_rate[0], r_rate[0]], where="post", linestyle="--")
 
     # plot interior rates
@@ -122,7 +106,7 @@ def plot_h(bounds: Bounds):
     return f
 
 
-def plot_h_inv(bounds: Bounds):
+def plot_h_inv(bounds: Bounds, fig: Figure | None = None):
     """Plot the (right inverse of h) mapping from budgets to x."""
     # get domain of h
     start, end = get_domain(bounds)
@@ -130,10 +114,10 @@ def plot_h_inv(bounds: Bounds):
     xs = range(start, end + 1)
 
     # evaluate on domain
-    solver = EquitableBudgetAllocator(bounds)
-    budgets = [sum(solver.allocations(x)) for x in xs]
+    solver = EquitableBudgetAllocator.cached(bounds)
+    budgets = np.fromiter((solver.budget(x) for x in xs), dtype=np.float64, count=len(xs))
 
-    f, ax = subplots()
+    f, ax = subplots(fig=fig)
     ax.xaxis.set_minor_locator(ticker.AutoMinorLocator(2))
 
     # plot right inverse function evaluation
@@ -151,13 +135,13 @@ def plot_h_inv(bounds: Bounds):
     # plot left / right extrapolation if unbounded
     if any(b[0] is None for b in bounds):
         l_xs = [start - padding, start]
-        l_budgets = [sum(solver.allocations(x)) for x in l_xs]
+        l_budgets = np.array([solver.budget(start - padding), budgets[0]])
         ax.plot(l_budgets, l_xs, linestyle="--")
     else:
         ax.plot(budgets[0], start, marker="o")
     if any(b[1] is None for b in bounds):
         r_xs = [end - 1, end + padding - 1]
-        r_budgets = [sum(solver.allocations(x)) for x in r_xs]
+        r_budgets = np.fromiter((solver.budget(x) for x in r_xs), dtype=np.float64, count=len(r_xs))
         ax.plot(r_budgets, r_xs, linestyle="--")
     else:
         ax.plot(budgets[-1], end, marker="o")
@@ -178,9 +162,42 @@ def main():
         (7, 10),
         (9, 12),
     )
-    savefig(plot_h(bounds), "monotonic")
-    savefig(plot_h_inv(bounds), "inverse")
+    # reuse the same figure for both plots
+    f = plot_h(bounds)
+    savefig(f, "monotonic")
+    savefig(plot_h_inv(bounds, fig=f), "inverse")
+
+
+@rc_context
+def render_case(case: tuple[str, Bounds]) -> str:
+    """Render and save plots of h and its inverse for a named case."""
+    name, bounds = case
+    f = plot_h(bounds)
+    savefig(f, f"monotonic_{name}")
+    savefig(plot_h_inv(bounds, fig=f), f"inverse_{name}")
+    plt.close(f)
+    return name
+
+
+def render_cases(cases: typing.Iterable[tuple[str, Bounds]], processes: int | None = None) -> list[str]:
+    """Render plots for independent cases in parallel (one worker process per core by default)."""
+    # use non-interactive backend in headless workers
+    with multiprocessing.Pool(processes, initializer=mpl.use, initargs=("Agg",)) as pool:
+        return list(pool.imap_unordered(render_case, cases))
+
+
+def main_cases(path: Path):
+    """Render plots for every case of bounds in a JSON file."""
+    cases = ((f"case{i}", bounds) for i, bounds in enumerate(json.loads(path.read_bytes())))
+    # skip cases without a plottable domain (fewer than two distinct explicit bound values)
+    render_cases(case for case in cases if len({b for bound in case[1] for b in bound if b is not None}) > 1)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Plot the mapping from x to budgets and its inverse.")
+    parser.add_argument("cases", nargs="?", type=Path, help="JSON file of bounds to render plots for every case of")
+    args = parser.parse_args()
+    if args.cases is None:
+        main()
+    else:
+        main_cases(args.cases)
@@ -1,12 +1,31 @@
+import functools
 import json
 from pathlib import Path
 
 import pytest
 
-from eqint.solver import Bounds
+from eqint.solver import Bounds, EquitableBudgetAllocator
+
+
+@functools.cache
+def load_cases() -> tuple[Bounds, ...]:
+    """Load bounds of test cases (once per process)."""
+    data = json.loads((Path("tests") / "cases.json").read_bytes())
+    return tuple(tuple(map(tuple, bounds_case)) for bounds_case in data)
+
+
+def pytest_generate_tests(metafunc: pytest.Metafunc):
+    # run tests requesting bounds as independent tests per case (allowing them to be distributed)
+    if "bounds" in metafunc.fixturenames:
+        cases = load_cases()
+        metafunc.parametrize("bounds", cases, ids=[f"case{i}" for i in range(len(cases))])
 
 
 @pytest.fixture(scope="session")
 def cases() -> tuple[Bounds, ...]:
-    with open(Path("tests") / "cases.json") as f:
-        return tuple(tuple(tuple(bounds) for bounds in bounds_case) for bounds_case in json.load(f))
+    return load_cases()
+
+
+@pytest.fixture(scope="session")
+def allocators(cases: tuple[Bounds, ...]) -> dict[Bounds, EquitableBudgetAllocator]:
+    return {bounds: EquitableBudgetAllocator(bounds) for bounds in cases}
@@ -1,8 +1,9 @@
+import array
+import math
 import typing
 
 import numpy as np
 import pytest
-from scipy.optimize import LinearConstraint, minimize
 
 from eqint import errors
 from eqint.solver import Bounds, EquitableBudgetAllocator, solve
@@ -10,6 +11,9 @@ from eqint.solver import Bounds, EquitableBudgetAllocator, solve
 
 def scipy_solve(bounds: Bounds, budget: int) -> list[float]:
     """Solve using trust-region constrained method."""
+    # NOTE: scipy is imported lazily as only the (slow) cross-validation tests use it
+    from scipy.optimize import LinearConstraint, minimize
+
     # define linear constraints
     lb = [b[0] if b[0] is not None else -np.inf for b in bounds] + [budget]
     ub = [b[1] if b[1] is not None else np.inf for b in bounds] + [budget]
@@ -17,17 +21,44 @@ def scipy_solve(bounds: Bounds, budget: int) -> list[float]:
     constraints = LinearConstraint(A, lb, ub)  # type: ignore
     # define optimization problem
     mean = budget / len(bounds)
-    x0 = [mean for _ in range(len(bounds))]  # initial guess of mean
+    # initial guess of mean clipped to bounds (with the residual budget spread evenly)
+    x0 = np.clip(mean, lb[:-1], ub[:-1])
+    x0 += (budget - x0.sum()) / len(bounds)
     fun = lambda x: sum([(x_n - mean) ** 2 for x_n in x])  # minimize squared residuals from mean
     return minimize(fun, x0=x0, constraints=constraints, method="trust-constr").x.tolist()
 
 
+def waterfill_solve(bounds: Bounds, budget: int) -> list[float]:
+    """Solve by water-filling (finding the level whose clipping to the bounds allocates the full budget)."""
+    lb = np.array([b[0] if b[0] is not None else -np.inf for b in bounds], dtype=np.float64)
+    ub = np.array([b[1] if b[1] is not None else np.inf for b in bounds], dtype=np.float64)
+    # the allocated budget is piecewise linear in the level with breakpoints at the finite bounds
+    breakpoints = np.unique(np.concatenate([lb, ub]))
+    breakpoints = breakpoints[np.isfinite(breakpoints)]
+    if not breakpoints.size:
+        return np.full(len(bounds), budget / len(bounds)).tolist()
+    budgets = np.clip(breakpoints[:, np.newaxis], lb, ub).sum(axis=1)
+    # extrapolate from the last breakpoint not exceeding the budget (or the first breakpoint)
+    k = max(int(np.searchsorted(budgets, budget, side="right")) - 1, 0)
+    x = breakpoints[k]
+    if budget != budgets[k]:
+        # rate of change is the number of allocations that are not bound on the side of the budget
+        if budget < budgets[k]:
+            rate = np.count_nonzero((lb < x) & (ub >= x))
+        else:
+            rate = np.count_nonzero((lb <= x) & (ub > x))
+        x += (budget - budgets[k]) / rate
+    return np.clip(x, lb, ub).tolist()
+
+
 def solution_correct(bounds: Bounds, budget: int) -> bool:
     """Check that a solution is optimal."""
     # solve for allocations
     allocations = solve(bounds, budget)
     return all(
         (
+            # every allocation is solved for
+            len(allocations) == len(bounds),
             # all bounds are adhered to
             constraints_met(bounds, allocations),
             # the full budget is allocated
@@ -42,10 +73,10 @@ def constraints_met(bounds: Bounds, allocations: tuple[int, ...]) -> bool:
     """Check that the full budget is allocated."""
     return all(
         # lower bounds are adhered to
-        (a >= b[0] if b[0] is not None else True)
+        (lb is None or a >= lb)
         # upper bounds are adhered to
-        and (a <= b[1] if b[1] is not None else True)
-        for a, b in zip(allocations, bounds)
+        and (ub is None or a <= ub)
+        for a, (lb, ub) in zip(allocations, bounds)
     )
 
 
@@ -59,12 +90,14 @@ def integers_optimal(bounds: Bounds, allocations: tuple[int, ...]) -> bool:
     # no integer can be reallocated in a way that would lead to a more equitable allocation; i.e.
     # the difference between the largest value that is not lower-bounded and the smallest value that
     # is not upper-bounded must be at-most 1
-    non_lower_bounded = tuple(a for a, b in zip(allocations, bounds) if b[0] is None or (b[0] is not None and a > b[0]))
-    non_upper_bounded = tuple(a for a, b in zip(allocations, bounds) if b[1] is None or (b[1] is not None and a < b[1]))
-    if non_lower_bounded and non_upper_bounded:
-        upper = max(non_lower_bounded)
-        lower = min(non_upper_bounded)
-        return abs(upper - lower) <= 1
+    upper = lower = None
+    for a, (lb, ub) in zip(allocations, bounds):
+        if lb is None or a > lb:
+            upper = a if upper is None or a > upper else upper
+        if ub is None or a < ub:
+            lower = a if lower is None or a < lower else lower
+    if upper is not None and lower is not None:
+        return upper - lower <= 1
     # if all values are either lower-bounded or upper-bounded, there is nothing to check as no
     # integers can be reallocated
     return True
@@ -76,6 +109,8 @@ def test_allocation_full():
     assert allocation_full((10, 10, 10), 30)
     assert allocation_full((10, 5, 12), 27)
     assert allocation_full((-10, -10, 20), 0)
+    assert allocation_full((2**62, 2**62), 2**63)
+    assert allocation_full((2**64, 1), 2**64 + 1)
 
     # False when allocations do not sum to budget
     assert not allocation_full((10, 10, 10), 29)
@@ -103,6 +138,35 @@ def test_constraints_met():
     assert not constraints_met(b, (28, 19, 21, 82))
     assert not constraints_met(b, (30, -82, 1, 8))
 
+    # bounds and allocations beyond the int64 range are compared exactly
+    big = np.iinfo(np.int64).max
+    assert constraints_met(((big, None), (None, -big - 1)), (big, -big - 1))
+    assert not constraints_met(((big, None), (None, -big - 1)), (big - 1, -big - 1))
+    assert not constraints_met(((None, big), (-big - 1, None)), (big + 1, 0))
+    assert constraints_met(((2**64, 2**64 + 1),), (2**64 + 1,))
+
+
+def test_integers_optimal():
+    b = (
+        (-5, 10),
+        (None, -10),
+        (None, None),
+    )
+
+    # True when no integer can be moved to a smaller allocation
+    assert integers_optimal(b, (0, -10, 1))
+    assert integers_optimal(b, (-5, -10, -10))
+    assert integers_optimal(b, (-5, -15, -14))
+    # True when allocations that could be reduced are all smaller than the ones that could be increased
+    assert integers_optimal(((-5, 10), (None, -10)), (-5, -10))
+    assert integers_optimal(((None, None), (None, None)), (2**64, 2**64 + 1))
+    assert not integers_optimal(((None, None), (None, None)), (2**64, 2**64 + 2))
+
+    # False when an integer can be moved to a smaller allocation
+    assert not integers_optimal(b, (0, -10, 2))
+    assert not integers_optimal(b, (-5, -15, -12))
+    assert not integers_optimal(b, (3, -12, 0))
+
 
 def test_trivial_constraints():
     # trivial constraints (reducing to constants) behaves as expected
@@ -156,6 +220,45 @@ def test_equality(cases: typing.Sequence[Bounds]):
     assert EquitableBudgetAllocator(cases[0]) == EquitableBudgetAllocator(cases[0])
     # solvers with different parameters evaluate to not be equal
     assert EquitableBudgetAllocator(cases[0]) != EquitableBudgetAllocator(cases[1])
+    # solvers with a subset of the parameters evaluate to not be equal
+    assert EquitableBudgetAllocator(cases[0]) != EquitableBudgetAllocator(cases[0][:-1])
+    # solvers with the same parameters in different sequence types evaluate to be equal
+    assert EquitableBudgetAllocator(cases[0]) == EquitableBudgetAllocator([list(b) for b in cases[0]])  # type: ignore
+
+
+def test_hash(cases: typing.Sequence[Bounds]):
+    # solvers with the same parameters hash to the same value
+    assert hash(EquitableBudgetAllocator(cases[0])) == hash(EquitableBudgetAllocator(cases[0]))
+    assert hash(EquitableBudgetAllocator(cases[0])) == hash(EquitableBudgetAllocator(list(cases[0])))
+    # solvers can be used as keys
+    solvers = {EquitableBudgetAllocator(bounds): bounds for bounds in cases}
+    assert all(solvers[EquitableBudgetAllocator(bounds)] == bounds for bounds in cases)
+
+
+def test_bounds_snapshot():
+    # changes to the provided bounds after construction do not affect the solver
+    bounds = [(0, 10), (None, None)]
+    solver = EquitableBudgetAllocator(bounds)
+    bounds.append((5, 5))
+    assert solver.bounds == ((0, 10), (None, None))
+    assert solver == EquitableBudgetAllocator(((0, 10), (None, None)))
+    assert solver.solve(20) == (10, 10)
+
+
+def test_table_cache(cases: typing.Sequence[Bounds]):
+    # solution tables are shared between solvers with the same parameters
+    assert EquitableBudgetAllocator(cases[0])._table is EquitableBudgetAllocator(cases[0])._table
+    # lists of bounds share tables with equivalent tuples of bounds
+    assert EquitableBudgetAllocator(list(cases[0]))._table is EquitableBudgetAllocator(cases[0])._table
+
+
+def test_allocator_cache(cases: typing.Sequence[Bounds]):
+    # cached allocators are shared between identical bounds
+    assert EquitableBudgetAllocator.cached(cases[0]) is EquitableBudgetAllocator.cached(list(cases[0]))
+    assert EquitableBudgetAllocator.cached(cases[0]) is EquitableBudgetAllocator.cached([list(b) for b in cases[0]])  # type: ignore
+    assert EquitableBudgetAllocator.cached(cases[0]) == EquitableBudgetAllocator(cases[0])
+    # cached allocators are not shared between different bounds
+    assert EquitableBudgetAllocator.cached(cases[0]) is not EquitableBudgetAllocator.cached(cases[1])
 
 
 def test_simple():
@@ -170,6 +273,9 @@ def test_simple():
     assert solve(((5, 10), (5, 10), (10, 30)), 40) == (10, 10, 20)
     assert solve(((5, 10), (5, 10), (10, 30)), 30) == (10, 10, 10)
     assert solve(((5, 10), (5, 10), (10, 30)), 20) == (5, 5, 10)
+    # bounds may be given as (unhashable) lists of lists
+    assert solve([[0, None], [1, 5]], 3) == (1, 2)  # type: ignore
+    assert solve([[0, None], [1, 5]], 3, integer=False) == (1.5, 1.5)  # type: ignore
 
     # testing extrapolation of unbounded problems
     assert solve(((None, 10), (5, 10), (10, 30)), -1000) == (-1015, 5, 10)
@@ -181,6 +287,25 @@ def test_simple():
     assert solve(((10, None), (5, 10), (-40, 30)), 60) == (25, 10, 25)
     assert solve(((10, None), (5, 10), (-40, 30)), 80) == (40, 10, 30)
 
+    # testing allocations sharing the same bounds
+    assert solve(((0, None), (0, None), (0, None)), 10) == (3, 3, 4)
+    assert solve(((-5, 5), (-5, 5)), -3) == (-2, -1)
+    assert solve(((4, 4), (4, 4), (4, 4)), 12) == (4, 4, 4)
+    with pytest.raises(errors.InsufficientBudgetError):
+        solve(((0, None), (0, None)), -1)
+    with pytest.raises(errors.ExcessBudgetError):
+        solve(((4, 4), (4, 4), (4, 4)), 13)
+
+    # testing extrapolation past regions where no allocation is free to increase
+    assert solve(((10, None), (None, -6)), 4) == (10, -6)
+    assert solve(((10, None), (None, -6)), -150) == (10, -160)
+    assert solve(((10, None), (None, -6)), 150) == (156, -6)
+
+    # integer solutions remain exact beyond floating point precision
+    assert sum(solve(((None, None), (None, None), (None, None)), 10**18 + 1)) == 10**18 + 1
+    assert solution_correct(((None, None), (0, None), (None, 10)), 10**20 + 1)
+    assert solve(((None, None), (0, None)), 10**18 + 1) == (5 * 10**17, 5 * 10**17 + 1)
+
     # budget is above upper bound
     with pytest.raises(errors.ExcessBudgetError):
         solve(((5, 50), (-10, 10)), 61)
@@ -195,32 +320,110 @@ def test_simple():
     # evaluation at lower bound works
     solve(((5, 50), (-10, 10)), -5)
 
-
-def test_solutions(cases: typing.Sequence[Bounds]):
-    # test solutions for variety of bounds and budgets
-    for bounds in cases:
-        solver = EquitableBudgetAllocator(bounds)
-        low = min([*[b[0] for b in solver.bounds if b[0] is not None], -400])
-        high = max([*[b[1] for b in solver.bounds if b[1] is not None], 400])
-        for budget in range(low - 20, high + 20, int((high - low) / 10)):
-            if (lb := solver.lower_bound) and budget < lb:
-                with pytest.raises(errors.InsufficientBudgetError):
-                    solver.solve(budget)
-            elif (ub := solver.upper_bound) and budget > ub:
-                with pytest.raises(errors.ExcessBudgetError):
-                    solver.solve(budget)
-            else:
-                assert solution_correct(bounds, budget)
-
-
-def test_scipy(cases: typing.Sequence[Bounds]):
+    # bounds summing to zero are enforced
+    with pytest.raises(errors.ExcessBudgetError):
+        solve(((None, 10), (None, -10)), 1)
+    with pytest.raises(errors.InsufficientBudgetError):
+        solve(((-10, None), (10, None)), -1)
+
+
+def test_solve_many(cases: typing.Sequence[Bounds]):
+    # batched solutions match individual solutions
+    solver = EquitableBudgetAllocator(cases[0])
+    budgets = range(-100, 100, 7)
+    assert solver.solve_many(budgets) == tuple(solver.solve(budget) for budget in budgets)
+    assert solver.solve_many(budgets, integer=False) == tuple(solver.solve(budget, integer=False) for budget in budgets)
+
+
+def test_solve_types(cases: typing.Sequence[Bounds]):
+    # integer and non-integer solutions are distinguished
+    solver = EquitableBudgetAllocator(cases[0])
+    assert all(isinstance(a, int) for a in solver.solve(100))
+    assert all(isinstance(a, float) for a in solver.solve(100, integer=False))
+
+
+def test_out(cases: typing.Sequence[Bounds]):
+    # solutions are written to preallocated buffers
+    solver = EquitableBudgetAllocator(cases[0])
+    for budget in range(-100, 100, 7):
+        int_out = array.array("q", bytes(8 * len(cases[0])))
+        assert solver.solve(budget, out=int_out) is int_out
+        assert tuple(int_out) == solver.solve(budget)
+        float_out = np.empty(len(cases[0]))
+        assert solver.solve(budget, integer=False, out=float_out) is float_out
+        assert tuple(float_out) == solver.solve(budget, integer=False)
+
+    # buffers must match the number of allocations (and are left untouched otherwise)
+    solver = EquitableBudgetAllocator(((0, None), (1, 5)))
+    for out in ([99, 99, 99], [99]):
+        with pytest.raises(ValueError):
+            solver.solve(3, out=out)
+        assert all(value == 99 for value in out)
+
+
+def test_budget(cases: typing.Sequence[Bounds], allocators: dict[Bounds, EquitableBudgetAllocator]):
+    # budget evaluation matches the sum of allocations
+    for solver in allocators.values():
+        for x in (-500, -20.5, -1, 0, 0.25, 3, 17.75, 40, 80, 500):
+            assert solver.budget(x) == pytest.approx(sum(solver.allocations(x)))
+
+    # budget evaluation is the inverse of the solution to x
+    solver = EquitableBudgetAllocator(cases[0])
+    for budget in range(-100, 100, 7):
+        assert solver.budget(solver._solve_x(budget)[0]) == pytest.approx(budget)
+
+    # unbounded budget evaluation is linear
+    assert EquitableBudgetAllocator(((None, None), (None, None))).budget(2.5) == 5
+    # budget evaluation for allocations sharing the same bounds is clamped
+    assert EquitableBudgetAllocator(((0, 3), (0, 3))).budget(-1) == 0
+    assert EquitableBudgetAllocator(((0, 3), (0, 3))).budget(2.5) == 5
+    assert EquitableBudgetAllocator(((0, 3), (0, 3))).budget(4) == 6
+
+
+def test_solutions(bounds: Bounds, allocators: dict[Bounds, EquitableBudgetAllocator]):
+    # test solutions for budgets around transitions (where the set of binding bounds changes)
+    solver = allocators[bounds]
+    transitions = {solver.budget(b) for bound in bounds for b in bound if b is not None}
+    critical = sorted({budget + d for budget in transitions for d in (-1, 0, 1)})
+    # subsample uniformly to at most 20 critical budgets
+    critical = critical[:: math.ceil(len(critical) / 20) or 1]
+    # include a few interior budgets and budgets beyond the feasible region
+    low = solver.lower_bound if solver.lower_bound is not None else -400
+    high = solver.upper_bound if solver.upper_bound is not None else 400
+    interior = range(low, high + 1, max((high - low) // 4, 1))
+    for budget in sorted({*critical, *interior, low - 20, low - 1, high + 1, high + 20}):
+        if (lb := solver.lower_bound) is not None and budget < lb:
+            with pytest.raises(errors.InsufficientBudgetError):
+                solver.solve(budget)
+        elif (ub := solver.upper_bound) is not None and budget > ub:
+            with pytest.raises(errors.ExcessBudgetError):
+                solver.solve(budget)
+        else:
+            assert solution_correct(bounds, budget)
+
+
+def test_waterfill(allocators: dict[Bounds, EquitableBudgetAllocator]):
+    # test the water-filling reference on simple cases
+    assert waterfill_solve(((None, None), (None, None)), 3) == [1.5, 1.5]
+    assert waterfill_solve(((0, 1), (None, None), (4, None)), 3) == [0.0, -1.0, 4.0]
+    assert waterfill_solve(((0, 2), (0, 2), (0, 4)), 7) == [2.0, 2.0, 3.0]
+    # test that real-valued solutions align with water-filling for variety of bounds and budgets
+    for bounds, solver in allocators.items():
+        low = solver.lower_bound if solver.lower_bound is not None else -400
+        high = solver.upper_bound if solver.upper_bound is not None else 400
+        for budget in range(low, high + 1, max((high - low) // 20, 1)):
+            solver_allocations = solver.solve(budget, integer=False)
+            assert solver_allocations == pytest.approx(waterfill_solve(bounds, budget), abs=1e-9)
+
+
+@pytest.mark.slow
+def test_scipy(bounds: Bounds, allocators: dict[Bounds, EquitableBudgetAllocator]):
     # test that real-valued solutions align with trust-region constrained methods
-    for bounds in cases:
-        solver = EquitableBudgetAllocator(bounds)
-        # NOTE: scipy optimizer for large cases is SLOW - only checking one budget per test case
-        low = sum([b[0] for b in solver.bounds if b[0] is not None] or [-400])
-        high = sum([b[1] for b in solver.bounds if b[1] is not None] or [600])
-        budget = (low + high) // 2
-        solver_allocations = solver.solve(budget, integer=False)
-        scipy_allocations = scipy_solve(bounds, budget)
-        assert solver_allocations == pytest.approx(scipy_allocations, abs=1e-2)
+    solver = allocators[bounds]
+    # NOTE: scipy optimizer for large cases is SLOW - only checking one budget per test case
+    low = sum([b[0] for b in solver.bounds if b[0] is not None] or [-400])
+    high = sum([b[1] for b in solver.bounds if b[1] is not None] or [600])
+    budget = (low + high) // 2
+    solver_allocations = solver.solve(budget, integer=False)
+    scipy_allocations = scipy_solve(bounds, budget)
+    assert solver_allocations == pytest.approx(scipy_allocations, abs=1e-2)